@@ -0,0 +1,120 @@
+"""ONNX Runtime embedding function for exported SentenceTransformer models.
+
+On CPU an int8-quantized ONNX export of the same encoder is typically 2-4x
+faster than the PyTorch model, because ONNX Runtime fuses LayerNorm+GEMM and
+uses VNNI int8 kernels. A model directory is produced once with optimum:
+
+    optimum-cli export onnx --model sentence-transformers/all-mpnet-base-v2 \
+        --task feature-extraction onnx/mpnet/
+    optimum-cli onnxruntime quantize --onnx_model onnx/mpnet \
+        --output onnx/mpnet-int8 --avx512_vnni
+
+Passing that directory as ``--model-name`` (or ``model_name``) makes both
+indexing and querying embed through ONNX Runtime instead of PyTorch.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+try:
+    from transformers import AutoTokenizer
+except ImportError:
+    AutoTokenizer = None
+
+
+# The quantized name comes first: it is what the documented optimum-cli
+# quantize step emits, and the int8 model is the one worth preferring when a
+# directory contains both exports.
+_ONNX_FILENAMES = ("model_quantized.onnx", "model.onnx")
+
+
+def _onnx_model_file(path: Path) -> Optional[Path]:
+    for filename in _ONNX_FILENAMES:
+        candidate = path / filename
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def is_onnx_model_dir(model_name: Union[str, Path]) -> bool:
+    """Return True when model_name points at a local ONNX export directory."""
+    path = Path(model_name)
+    return path.is_dir() and _onnx_model_file(path) is not None
+
+
+class OnnxEmbeddingFunction:
+    """Chroma-compatible embedding function backed by an ONNX Runtime session.
+
+    Mean-pools the token embeddings over the attention mask and L2-normalizes,
+    matching SentenceTransformer pooling for the exported models.
+    """
+
+    def __init__(self, model_dir: Union[str, Path], *, max_length: int = 512) -> None:
+        if ort is None or AutoTokenizer is None:
+            raise ImportError(
+                "onnxruntime and transformers are required to embed with an "
+                "ONNX model directory"
+            )
+        model_dir = Path(model_dir)
+        model_file = _onnx_model_file(model_dir)
+        if model_file is None:
+            raise FileNotFoundError(f"no ONNX model found in {model_dir}")
+        self._model_dir = model_dir
+        self._tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self._session = ort.InferenceSession(
+            str(model_file), providers=["CPUExecutionProvider"]
+        )
+        self._input_names = [i.name for i in self._session.get_inputs()]
+        self._max_length = max_length
+
+    # Chroma 1.x calls these on any embedding function handed to
+    # get_collection / query, so __call__ alone is not enough.
+    @staticmethod
+    def name() -> str:
+        return "onnx_local"
+
+    def get_config(self) -> Dict[str, Union[str, int]]:
+        return {"model_dir": str(self._model_dir), "max_length": self._max_length}
+
+    @staticmethod
+    def build_from_config(config: Dict) -> "OnnxEmbeddingFunction":
+        return OnnxEmbeddingFunction(
+            config["model_dir"], max_length=int(config.get("max_length", 512))
+        )
+
+    def embed_query(self, input: Sequence[str]) -> List[List[float]]:
+        return self(input)
+
+    def embed_documents(self, input: Sequence[str]) -> List[List[float]]:
+        return self(input)
+
+    def __call__(self, input: Sequence[str]) -> List[List[float]]:
+        encoded = self._tokenizer(
+            list(input),
+            padding=True,
+            truncation=True,
+            max_length=self._max_length,
+            return_tensors="np",
+        )
+        feeds = {
+            name: np.asarray(encoded[name], dtype=np.int64)
+            for name in self._input_names
+            if name in encoded
+        }
+        token_embeddings = self._session.run(None, feeds)[0]
+        mask = np.asarray(encoded["attention_mask"], dtype=np.float32)[..., None]
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        embeddings = summed / counts
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (embeddings / norms).tolist()
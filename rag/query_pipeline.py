@@ -2,16 +2,42 @@
 
 from __future__ import annotations
 
+import asyncio
+import functools
 import json
+import re
 import textwrap
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Tuple
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 import chromadb
 from chromadb.api.models.Collection import Collection
 from chromadb.utils import embedding_functions
 import requests
 
+try:
+    import httpx
+except ImportError:  # httpx is optional; async calls fall back to threads
+    httpx = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from rag.onnx_embedding import OnnxEmbeddingFunction, is_onnx_model_dir
+from rag.semantic_cache import SemanticCache
+
+
+_SESSION = requests.Session()
+_ADAPTER = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=16)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+_ASYNC_CLIENT: Optional["httpx.AsyncClient"] = None
+_ASYNC_CLIENT_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
 
 DEFAULT_ANSWER_INSTRUCTIONS = textwrap.dedent(
     """
@@ -63,36 +89,314 @@ class QueryResult:
     fallback_used: bool
 
 
+@functools.lru_cache(maxsize=8)
+def _get_embedder(model_name: str):
+    """Return a process-lifetime embedding function for model_name.
+
+    Loading the model weights takes hundreds of MB and several seconds, so the
+    instance is shared across all queries using the same model. A local ONNX
+    export directory selects the ONNX Runtime path (see rag/onnx_embedding.py),
+    which is markedly faster on CPU.
+    """
+    if is_onnx_model_dir(model_name):
+        return OnnxEmbeddingFunction(model_name)
+    return embedding_functions.SentenceTransformerEmbeddingFunction(
+        model_name=model_name
+    )
+
+
+@functools.lru_cache(maxsize=4)
+def _get_client(persist_dir: str) -> chromadb.PersistentClient:
+    """Return a cached PersistentClient; opening one re-reads the SQLite
+    metadata DB and memory-maps the HNSW indices, which is pure overhead
+    when repeated per query."""
+    return chromadb.PersistentClient(path=persist_dir)
+
+
+@functools.lru_cache(maxsize=8)
+def _get_collection(
+    persist_dir: str, collection_name: str, model_name: str
+) -> Collection:
+    """Return a cached Chroma collection handle for the given index."""
+    return _get_client(persist_dir).get_collection(
+        collection_name, embedding_function=_get_embedder(model_name)
+    )
+
+
+def warmup(
+    persist_dir: str,
+    collection_name: str,
+    model_name: str = "sentence-transformers/all-mpnet-base-v2",
+) -> None:
+    """Prime the client, collection, embedder, and HNSW index at startup.
+
+    A dummy query pages in the index and runs one transformer forward pass
+    so the first real question does not pay the cold-start cost.
+    """
+    collection = _get_collection(persist_dir, collection_name, model_name)
+    collection.query(query_texts=["warmup"], n_results=1)
+
+
+class _QueryBatcher:
+    """Coalesce concurrent questions into a single ``collection.query`` call.
+
+    Questions submitted within a short window share one embedding forward pass
+    and one ANN search; results are fanned back out to the per-question futures.
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        top_k: int,
+        *,
+        max_batch: int = 8,
+        window: float = 0.01,
+    ) -> None:
+        self._collection = collection
+        self._top_k = top_k
+        self._max_batch = max_batch
+        self._window = window
+        # The queue (and the futures travelling through it) bind to this
+        # loop; _get_batcher recreates the batcher when the loop changes.
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, question: str) -> Tuple[List[str], List[str], List[dict]]:
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((question, future))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+        return await future
+
+    async def _drain(self) -> None:
+        while not self._queue.empty():
+            batch = [await self._queue.get()]
+            # Any failure past this point — not just the collection call —
+            # must fail the batch futures, or their submitters hang forever.
+            try:
+                while len(batch) < self._max_batch:
+                    try:
+                        batch.append(
+                            await asyncio.wait_for(
+                                self._queue.get(), timeout=self._window
+                            )
+                        )
+                    except asyncio.TimeoutError:
+                        break
+                results = await asyncio.to_thread(
+                    self._collection.query,
+                    query_texts=[question for question, _ in batch],
+                    n_results=self._top_k,
+                    include=["documents", "metadatas", "distances"],
+                )
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            for idx, (_, future) in enumerate(batch):
+                if not future.done():
+                    future.set_result(
+                        (
+                            results["ids"][idx],
+                            results["documents"][idx],
+                            results["metadatas"][idx],
+                        )
+                    )
+
+
+_BATCHERS: Dict[Tuple[str, str, str, int], _QueryBatcher] = {}
+
+
+def _get_batcher(
+    persist_dir: str, collection_name: str, model_name: str, top_k: int
+) -> _QueryBatcher:
+    key = (persist_dir, collection_name, model_name, top_k)
+    batcher = _BATCHERS.get(key)
+    # A batcher from an earlier asyncio.run() holds a queue bound to that
+    # now-closed loop; reusing it deadlocks, so build a fresh one per loop.
+    if batcher is None or batcher._loop is not asyncio.get_running_loop():
+        batcher = _QueryBatcher(
+            _get_collection(persist_dir, collection_name, model_name), top_k
+        )
+        _BATCHERS[key] = batcher
+    return batcher
+
+
+def _ollama_payload(
+    model: str, prompt: str, temperature: float, format_json: bool, stream: bool
+) -> Dict:
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "temperature": temperature,
+        "stream": stream,
+    }
+    if format_json:
+        # Ollama's grammar-constrained sampling guarantees valid JSON output.
+        payload["format"] = "json"
+    return payload
+
+
 def call_ollama(
     url: str,
     model: str,
     prompt: str,
     temperature: float,
+    format_json: bool = False,
+    on_token: Optional[Callable[[str], None]] = None,
 ) -> str:
+    """Generate a completion, streaming NDJSON chunks as they arrive.
+
+    Streaming keeps Ollama from buffering the whole generation server-side;
+    ``on_token`` lets CLI callers surface partial output immediately. The
+    accumulated response is returned either way.
+    """
     endpoint = url.rstrip("/") + "/api/generate"
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "temperature": temperature,
-        "stream": False,
-    }
-    response = requests.post(endpoint, json=payload, timeout=120)
+    payload = _ollama_payload(model, prompt, temperature, format_json, stream=True)
+    parts: List[str] = []
+    with _SESSION.post(endpoint, json=payload, stream=True, timeout=120) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            token = chunk.get("response", "")
+            if token:
+                parts.append(token)
+                if on_token is not None:
+                    on_token(token)
+            if chunk.get("done"):
+                break
+    return "".join(parts).strip()
+
+
+def _get_async_client() -> "httpx.AsyncClient":
+    global _ASYNC_CLIENT, _ASYNC_CLIENT_LOOP
+    # httpx transports bind to the running loop like the batcher queue does;
+    # a client from a previous asyncio.run() cannot be awaited on a new loop.
+    loop = asyncio.get_running_loop()
+    if _ASYNC_CLIENT is None or _ASYNC_CLIENT_LOOP is not loop:
+        _ASYNC_CLIENT = httpx.AsyncClient(timeout=120)
+        _ASYNC_CLIENT_LOOP = loop
+    return _ASYNC_CLIENT
+
+
+async def call_ollama_async(
+    url: str,
+    model: str,
+    prompt: str,
+    temperature: float,
+    format_json: bool = False,
+) -> str:
+    """Async counterpart of :func:`call_ollama` using a pooled httpx client."""
+    if httpx is None:
+        return await asyncio.to_thread(
+            call_ollama,
+            url=url,
+            model=model,
+            prompt=prompt,
+            temperature=temperature,
+            format_json=format_json,
+        )
+    endpoint = url.rstrip("/") + "/api/generate"
+    payload = _ollama_payload(model, prompt, temperature, format_json, stream=False)
+    response = await _get_async_client().post(endpoint, json=payload)
     response.raise_for_status()
     return response.json().get("response", "").strip()
 
 
+@functools.lru_cache(maxsize=8)
+def _get_semantic_cache(model_name: str, persist_dir: str) -> SemanticCache:
+    embedder = _get_embedder(model_name)
+    return SemanticCache(
+        lambda text: embedder([text])[0],
+        persist_path=Path(persist_dir) / "semcache.npz",
+    )
+
+
+def call_ollama_cached(
+    url: str,
+    model: str,
+    prompt: str,
+    temperature: float,
+    *,
+    question: str,
+    model_name: str = "sentence-transformers/all-mpnet-base-v2",
+    persist_dir: str = ".chroma",
+    format_json: bool = False,
+) -> str:
+    """Call Ollama, short-circuiting when a semantically similar query is cached.
+
+    Paraphrased questions hit the cache in milliseconds instead of waiting
+    seconds for LLM inference; misses fall through to :func:`call_ollama` and
+    populate the cache.
+    """
+    cache = _get_semantic_cache(model_name, persist_dir)
+    cached = cache.lookup(question, prompt, model=model, temperature=temperature)
+    if cached is not None:
+        return cached
+    answer = call_ollama(
+        url=url,
+        model=model,
+        prompt=prompt,
+        temperature=temperature,
+        format_json=format_json,
+    )
+    cache.store(question, prompt, answer, model=model, temperature=temperature)
+    return answer
+
+
+async def call_ollama_cached_async(
+    url: str,
+    model: str,
+    prompt: str,
+    temperature: float,
+    *,
+    question: str,
+    model_name: str = "sentence-transformers/all-mpnet-base-v2",
+    persist_dir: str = ".chroma",
+) -> str:
+    """Async variant of :func:`call_ollama_cached`."""
+    cache = _get_semantic_cache(model_name, persist_dir)
+    cached = await asyncio.to_thread(
+        cache.lookup, question, prompt, model=model, temperature=temperature
+    )
+    if cached is not None:
+        return cached
+    answer = await call_ollama_async(
+        url=url, model=model, prompt=prompt, temperature=temperature
+    )
+    await asyncio.to_thread(
+        cache.store, question, prompt, answer, model=model, temperature=temperature
+    )
+    return answer
+
+
+# Keyword -> kind mapping in priority order; matched in a single regex scan.
+_KIND_KEYWORDS = (
+    ("tutorial", "tutorial"),
+    ("example", "tutorial"),
+    ("namespace", "namespace"),
+    ("planner", "class"),
+    ("class", "class"),
+    ("algorithm", "class"),
+    ("function", "function"),
+    ("method", "function"),
+    ("api", "function"),
+    ("file", "file"),
+)
+_KIND_RE = re.compile("|".join(keyword for keyword, _ in _KIND_KEYWORDS))
+
+
 def infer_kind_from_question(question: str) -> Optional[str]:
-    lower = question.lower()
-    if "tutorial" in lower or "example" in lower:
-        return "tutorial"
-    if "namespace" in lower:
-        return "namespace"
-    if any(keyword in lower for keyword in ("planner", "class", "algorithm")):
-        return "class"
-    if any(keyword in lower for keyword in ("function", "method", "api")):
-        return "function"
-    if "file" in lower:
-        return "file"
+    found = set(_KIND_RE.findall(question.lower()))
+    if not found:
+        return None
+    for keyword, kind in _KIND_KEYWORDS:
+        if keyword in found:
+            return kind
     return None
 
 
@@ -112,7 +416,9 @@ def _build_filter(
     metadata_filter: Optional[Dict],
 ) -> Tuple[Optional[Dict], Optional[str]]:
     inferred_kind = infer_kind_from_question(question) if auto_filter else None
-    kind_filter = {"kind": {"$eq": inferred_kind}} if inferred_kind else None
+    # Short-form equality ({"kind": value}) stays on Chroma's fast path;
+    # the $and/$eq form forces the slower post-ANN filter walk.
+    kind_filter = {"kind": inferred_kind} if inferred_kind else None
     final_filter = _combine_filters([kind_filter, metadata_filter])
     return final_filter, inferred_kind
 
@@ -142,6 +448,26 @@ def format_context(documents: List[str], metadatas: List[dict]) -> str:
     return "\n\n".join(blocks)
 
 
+@functools.lru_cache(maxsize=1024)
+def _format_context_cached(
+    ids_key: Tuple[str, ...], documents: Tuple[str, ...], metadatas_json: str
+) -> str:
+    return format_context(list(documents), json.loads(metadatas_json))
+
+
+def _context_from_results(
+    ids: List[str], documents: List[str], metadatas: List[dict]
+) -> str:
+    """Format context, memoized on the retrieved ids.
+
+    Repeated queries and semantic-cache near-misses frequently retrieve the
+    same document set; the joined context string is reused instead of being
+    rebuilt. Metadata dicts are serialized deterministically to stay hashable.
+    """
+    metadatas_json = json.dumps(metadatas, sort_keys=True, ensure_ascii=False)
+    return _format_context_cached(tuple(ids), tuple(documents), metadatas_json)
+
+
 def _query_collection(
     collection: Collection,
     question: str,
@@ -157,6 +483,15 @@ def _query_collection(
     )
 
 
+_ANSWER_PROMPT_TEMPLATE = "{instructions}\n\nContext:\n{context}\n\nQuestion:\n{question}"
+
+
+def _assemble_prompt(instructions: str, context: str, question: str) -> str:
+    return _ANSWER_PROMPT_TEMPLATE.format(
+        instructions=instructions, context=context, question=question
+    )
+
+
 def run_rag_query(
     question: str,
     *,
@@ -171,13 +506,7 @@ def run_rag_query(
     metadata_filter: Optional[Dict] = None,
     answer_instructions: Optional[str] = None,
 ) -> QueryResult:
-    embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=model_name
-    )
-    client = chromadb.PersistentClient(path=persist_dir)
-    collection = client.get_collection(
-        collection_name, embedding_function=embedding_fn
-    )
+    collection = _get_collection(persist_dir, collection_name, model_name)
 
     where_clause, inferred_kind = _build_filter(
         question=question,
@@ -201,25 +530,158 @@ def run_rag_query(
 
     documents = results["documents"][0]
     metadatas = results["metadatas"][0]
-    context = format_context(documents, metadatas)
+    context = _context_from_results(results["ids"][0], documents, metadatas)
     instructions = answer_instructions or DEFAULT_ANSWER_INSTRUCTIONS
-    prompt = textwrap.dedent(
-        f"""
-        {instructions}
+    prompt = _assemble_prompt(instructions, context, question)
 
-        Context:
-        {context}
+    answer = call_ollama_cached(
+        url=ollama_url,
+        model=ollama_model,
+        prompt=prompt,
+        temperature=temperature,
+        question=question,
+        model_name=model_name,
+        persist_dir=persist_dir,
+    )
+    return QueryResult(
+        context=context,
+        answer=answer,
+        inferred_kind=inferred_kind,
+        applied_filter=where_clause,
+        fallback_used=fallback_used,
+    )
 
-        Question:
-        {question}
-        """
-    ).strip()
 
-    answer = call_ollama(
+def run_rag_queries(
+    questions: List[str],
+    *,
+    persist_dir: str = ".chroma",
+    collection_name: str,
+    model_name: str = "sentence-transformers/all-mpnet-base-v2",
+    ollama_model: str = "deepseek-r1:8b",
+    ollama_url: str = "http://localhost:11434",
+    top_k: int = 5,
+    temperature: float = 0.1,
+    answer_instructions: Optional[str] = None,
+) -> List[QueryResult]:
+    """Answer several questions with a single batched retrieval.
+
+    All questions are embedded in one forward pass and searched with one
+    ``collection.query`` call, which is markedly cheaper than N single
+    queries. Kind/metadata filters are not applied in batch mode because a
+    ``where`` clause would constrain every question identically.
+    """
+    if not questions:
+        return []
+    collection = _get_collection(persist_dir, collection_name, model_name)
+    results = collection.query(
+        query_texts=list(questions),
+        n_results=top_k,
+        include=["documents", "metadatas", "distances"],
+    )
+    instructions = answer_instructions or DEFAULT_ANSWER_INSTRUCTIONS
+    outputs: List[QueryResult] = []
+    for idx, question in enumerate(questions):
+        context = _context_from_results(
+            results["ids"][idx], results["documents"][idx], results["metadatas"][idx]
+        )
+        prompt = _assemble_prompt(instructions, context, question)
+        answer = call_ollama_cached(
+            url=ollama_url,
+            model=ollama_model,
+            prompt=prompt,
+            temperature=temperature,
+            question=question,
+            model_name=model_name,
+            persist_dir=persist_dir,
+        )
+        outputs.append(
+            QueryResult(
+                context=context,
+                answer=answer,
+                inferred_kind=None,
+                applied_filter=None,
+                fallback_used=False,
+            )
+        )
+    return outputs
+
+
+async def run_rag_query_async(
+    question: str,
+    *,
+    persist_dir: str = ".chroma",
+    collection_name: str,
+    model_name: str = "sentence-transformers/all-mpnet-base-v2",
+    ollama_model: str = "deepseek-r1:8b",
+    ollama_url: str = "http://localhost:11434",
+    top_k: int = 5,
+    temperature: float = 0.1,
+    auto_filter: bool = True,
+    metadata_filter: Optional[Dict] = None,
+    answer_instructions: Optional[str] = None,
+) -> QueryResult:
+    """Async variant of :func:`run_rag_query` with query coalescing.
+
+    Unfiltered retrievals are funneled through a shared batcher so that
+    concurrent questions share a single embedding pass and ANN search.
+    """
+    collection = _get_collection(persist_dir, collection_name, model_name)
+
+    where_clause, inferred_kind = _build_filter(
+        question=question,
+        auto_filter=auto_filter,
+        metadata_filter=metadata_filter,
+    )
+
+    async def _retrieve() -> Tuple[List[str], List[str], List[dict], Optional[Dict], Optional[str], bool]:
+        ids: List[str] = []
+        documents: List[str] = []
+        metadatas: List[dict] = []
+        fallback_used = False
+        where, kind = where_clause, inferred_kind
+        if where is not None:
+            try:
+                results = await asyncio.to_thread(
+                    _query_collection,
+                    collection,
+                    question,
+                    top_k=top_k,
+                    where=where,
+                )
+                ids = results["ids"][0]
+                documents = results["documents"][0]
+                metadatas = results["metadatas"][0]
+            except Exception:
+                documents = []
+            if not documents:
+                fallback_used = True
+                where = None
+                kind = None
+        if where is None:
+            batcher = _get_batcher(persist_dir, collection_name, model_name, top_k)
+            ids, documents, metadatas = await batcher.submit(question)
+        return ids, documents, metadatas, where, kind, fallback_used
+
+    # Retrieval (embedding + ANN search) runs on a worker thread while the
+    # event loop stays free for prompt preparation and other queries.
+    retrieval = asyncio.create_task(_retrieve())
+    instructions = answer_instructions or DEFAULT_ANSWER_INSTRUCTIONS
+    ids, documents, metadatas, where_clause, inferred_kind, fallback_used = (
+        await retrieval
+    )
+
+    context = _context_from_results(ids, documents, metadatas)
+    prompt = _assemble_prompt(instructions, context, question)
+
+    answer = await call_ollama_cached_async(
         url=ollama_url,
         model=ollama_model,
         prompt=prompt,
         temperature=temperature,
+        question=question,
+        model_name=model_name,
+        persist_dir=persist_dir,
     )
     return QueryResult(
         context=context,
@@ -231,32 +693,27 @@ def run_rag_query(
 
 
 def _extract_json_object(text: str) -> Optional[Dict]:
+    loads = orjson.loads if orjson is not None else json.loads
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
-    start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        snippet = text[start : end + 1]
+        parsed = loads(text)
+    except Exception:
+        # Fallback for models answering without JSON mode enabled.
+        start = text.find("{")
+        end = text.rfind("}")
+        if start == -1 or end <= start:
+            return None
         try:
-            return json.loads(snippet)
-        except json.JSONDecodeError:
+            parsed = loads(text[start : end + 1])
+        except Exception:
             return None
-    return None
+    return parsed if isinstance(parsed, dict) else None
 
 
-def classify_question(
-    question: str,
-    *,
-    ollama_model: str = "deepseek-r1:8b",
-    ollama_url: str = "http://localhost:11434",
-    temperature: float = 0.0,
-    labels: Tuple[str, ...] = CLASSIFICATION_LABELS,
-) -> Dict[str, str]:
+def _classification_prompt_template(labels: Tuple[str, ...]) -> str:
+    """Build the classification prompt with everything but the question baked in."""
     label_list = "\n".join(f"- {label}" for label in labels)
-    prompt = textwrap.dedent(
-        f"""
+    return textwrap.dedent(
+        """\
         You are a classifier for research questions.
         Read the user question and decide which label best describes it.
         Choose only from:
@@ -266,18 +723,48 @@ def classify_question(
         task_and_motion_planning: Questions about integrated task-and-motion planning, high-level symbolic reasoning combined with motion.
         general: Only if the question is clearly unrelated to motion planning / OMPL / task-and-motion topics.
         Context about available collections:
-        {CLASSIFICATION_CONTEXT}
+        {context}
         Respond ONLY in JSON with keys "label" and "reason".
 
         Question:
-        {question}
-        """
-    ).strip()
-    response = call_ollama(
+        {{question}}"""
+    ).format(label_list=label_list, context=CLASSIFICATION_CONTEXT)
+
+
+_CLASSIFY_PROMPT_TEMPLATE = _classification_prompt_template(CLASSIFICATION_LABELS)
+
+
+def classify_question(
+    question: str,
+    *,
+    ollama_model: str = "deepseek-r1:8b",
+    ollama_url: str = "http://localhost:11434",
+    temperature: float = 0.0,
+    labels: Tuple[str, ...] = CLASSIFICATION_LABELS,
+    model_name: str = "sentence-transformers/all-mpnet-base-v2",
+    persist_dir: str = ".chroma",
+) -> Dict[str, str]:
+    """Classify a question, caching by similarity like the answer path.
+
+    ``model_name`` and ``persist_dir`` select the semantic-cache embedder and
+    location; pass the retrieval pipeline's values so cache lookups reuse the
+    already-loaded embedding model instead of loading the default one.
+    """
+    template = (
+        _CLASSIFY_PROMPT_TEMPLATE
+        if labels == CLASSIFICATION_LABELS
+        else _classification_prompt_template(labels)
+    )
+    prompt = template.format(question=question)
+    response = call_ollama_cached(
         url=ollama_url,
         model=ollama_model,
         prompt=prompt,
         temperature=temperature,
+        question=question,
+        model_name=model_name,
+        persist_dir=persist_dir,
+        format_json=True,
     )
     parsed = _extract_json_object(response) or {}
     label = str(parsed.get("label", "")).strip().lower()
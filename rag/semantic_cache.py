@@ -0,0 +1,140 @@
+"""Semantic LRU cache for LLM responses keyed by query-embedding similarity."""
+
+from __future__ import annotations
+
+import atexit
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+
+PROMPT_GUARD_CHARS = 200
+
+
+def _guard_key(prompt: str, model: str, temperature: float) -> str:
+    """Build the exact-match guard stored next to each embedding.
+
+    Includes the generation model and temperature so switching --ollama-model
+    (or sampling settings) never replays an answer produced by a different
+    configuration, plus a prompt prefix that separates e.g. classification
+    prompts from answer prompts for the same question.
+    """
+    return f"{model}\x00{temperature:g}\x00{prompt[:PROMPT_GUARD_CHARS]}"
+
+
+class SemanticCache:
+    """Cache LLM responses and reuse them for semantically similar queries.
+
+    Entries store the question embedding, a guard key (model, temperature,
+    and a prompt prefix), and the response. On lookup the query is embedded
+    with the same model as the retrieval pipeline and compared against the
+    cached embeddings sharing the guard key with one matrix-vector product;
+    if the best cosine similarity exceeds ``threshold`` the cached response
+    is returned without calling the LLM.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], Sequence[float]],
+        *,
+        threshold: float = 0.92,
+        max_entries: int = 2048,
+        persist_path: Optional[Path] = None,
+    ) -> None:
+        self._embed = embed
+        self._threshold = threshold
+        self._max_entries = max_entries
+        self._persist_path = Path(persist_path) if persist_path else None
+        self._embeddings: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._guards: List[str] = []
+        self._responses: List[str] = []
+        if self._persist_path is not None:
+            self._load()
+            atexit.register(self.save)
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def _embed_query(self, question: str) -> np.ndarray:
+        vector = np.asarray(self._embed(question), dtype=np.float32).reshape(-1)
+        return vector
+
+    def lookup(
+        self, question: str, prompt: str, *, model: str, temperature: float
+    ) -> Optional[str]:
+        if self._embeddings is None or not len(self._responses):
+            return None
+        # Pre-filter on the guard so entries with a different model,
+        # temperature, or prompt shape (e.g. classification vs answer for the
+        # same question) never shadow each other at the argmax.
+        guard = _guard_key(prompt, model, temperature)
+        candidates = [idx for idx, g in enumerate(self._guards) if g == guard]
+        if not candidates:
+            return None
+        query = self._embed_query(question)
+        qnorm = np.linalg.norm(query)
+        if qnorm == 0:
+            return None
+        scores = self._embeddings[candidates] @ query / (
+            self._norms[candidates] * qnorm
+        )
+        best = int(np.argmax(scores))
+        if scores[best] < self._threshold:
+            return None
+        return self._responses[candidates[best]]
+
+    def store(
+        self, question: str, prompt: str, response: str, *, model: str, temperature: float
+    ) -> None:
+        vector = self._embed_query(question)[None, :]
+        if self._embeddings is None:
+            self._embeddings = vector
+        else:
+            self._embeddings = np.concatenate([self._embeddings, vector])
+        self._norms = np.linalg.norm(self._embeddings, axis=1)
+        self._norms[self._norms == 0] = 1.0
+        self._guards.append(_guard_key(prompt, model, temperature))
+        self._responses.append(response)
+        if len(self._responses) > self._max_entries:
+            drop = len(self._responses) - self._max_entries
+            self._embeddings = self._embeddings[drop:]
+            self._norms = self._norms[drop:]
+            del self._guards[:drop]
+            del self._responses[:drop]
+
+    def _load(self) -> None:
+        if self._persist_path is None or not self._persist_path.exists():
+            return
+        try:
+            data = np.load(self._persist_path, allow_pickle=False)
+            embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+            # Caches persisted before the guard included model/temperature
+            # lack this key and are discarded here rather than replayed.
+            guards = [str(g) for g in data["guards"]]
+            responses = [str(r) for r in data["responses"]]
+        except Exception:
+            return
+        if len(guards) != len(responses) or embeddings.shape[0] != len(responses):
+            return
+        self._embeddings = embeddings if embeddings.size else None
+        if self._embeddings is not None:
+            self._norms = np.linalg.norm(self._embeddings, axis=1)
+            self._norms[self._norms == 0] = 1.0
+        self._guards = guards
+        self._responses = responses
+
+    def save(self) -> None:
+        if self._persist_path is None or self._embeddings is None:
+            return
+        try:
+            self._persist_path.parent.mkdir(parents=True, exist_ok=True)
+            np.savez_compressed(
+                self._persist_path,
+                embeddings=self._embeddings,
+                guards=np.asarray(self._guards),
+                responses=np.asarray(self._responses),
+            )
+        except OSError:
+            pass
@@ -5,20 +5,34 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, List, Optional
 
 import chromadb
-from chromadb.utils import embedding_functions
+import torch
+from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
+from rag.onnx_embedding import OnnxEmbeddingFunction, is_onnx_model_dir
 
-def iter_chunks(chunk_file: Path) -> Iterable[Dict]:
-    with chunk_file.open("r", encoding="utf-8") as handle:
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def iter_chunks(chunk_file: Path, progress: Optional[tqdm] = None) -> Iterable[Dict]:
+    """Yield chunk records, optionally advancing a byte-based progress bar."""
+    with chunk_file.open("rb") as handle:
         for line in handle:
+            if progress is not None:
+                progress.update(len(line))
             if not line.strip():
                 continue
-            yield json.loads(line)
+            yield _loads(line)
 
 
 def batched(iterable: Iterable[Dict], batch_size: int) -> Iterable[List[Dict]]:
@@ -39,12 +53,33 @@ def build_index(
     model_name: str,
     batch_size: int,
     reset: bool,
+    hnsw_space: str = "ip",
 ) -> None:
     persist_dir.mkdir(parents=True, exist_ok=True)
     client = chromadb.PersistentClient(path=str(persist_dir))
-    embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=model_name
-    )
+    if is_onnx_model_dir(model_name):
+        onnx_fn = OnnxEmbeddingFunction(model_name)
+
+        def encode(documents: List[str]) -> List[List[float]]:
+            return onnx_fn(documents)
+
+        print(f"Embedding with ONNX Runtime model at {model_name}.")
+    else:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        model = SentenceTransformer(model_name, device=device)
+        if device == "cuda":
+            model.half()
+
+        def encode(documents: List[str]) -> List[List[float]]:
+            return model.encode(
+                documents,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            ).tolist()
+
+        print(f"Embedding with {model_name} on {device}.")
 
     if reset:
         try:
@@ -53,17 +88,32 @@ def build_index(
         except chromadb.errors.NotFoundError:
             pass
 
+    # Embeddings are L2-normalized, so inner product ranks identically to
+    # cosine while skipping the per-comparison norm division.
+    # embedding_function=None is load-bearing: embeddings are supplied
+    # explicitly on upsert, and omitting the argument would persist chroma's
+    # default-EF config into the collection, which then conflicts with the
+    # SentenceTransformer EF the query side passes to get_collection.
     collection = client.get_or_create_collection(
         name=collection_name,
-        metadata={"hnsw:space": "cosine"},
-        embedding_function=embedding_fn,
+        metadata={"hnsw:space": hnsw_space},
+        embedding_function=None,
     )
 
-    total = sum(1 for _ in chunk_path.open("r", encoding="utf-8"))
-    progress = tqdm(total=total, desc="Indexing chunks")
+    total_bytes = os.path.getsize(chunk_path)
+    progress = tqdm(
+        total=total_bytes,
+        desc="Indexing chunks",
+        unit="B",
+        unit_scale=True,
+        miniters=max(1, total_bytes // 200),
+        mininterval=0.5,
+        smoothing=0,
+        bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]",
+    )
     next_id = 0
 
-    for batch in batched(iter_chunks(chunk_path), batch_size=batch_size):
+    for batch in batched(iter_chunks(chunk_path, progress), batch_size=batch_size):
         documents = [record["text"] for record in batch]
         metadatas = []
         for record in batch:
@@ -79,8 +129,12 @@ def build_index(
             )
         ids = [f"chunk-{next_id + i}" for i in range(len(batch))]
         next_id += len(batch)
-        collection.upsert(documents=documents, metadatas=metadatas, ids=ids)
-        progress.update(len(batch))
+        collection.upsert(
+            documents=documents,
+            metadatas=metadatas,
+            ids=ids,
+            embeddings=encode(documents),
+        )
 
     progress.close()
     print(f"Indexed {next_id} chunks into collection '{collection_name}'.")
@@ -112,12 +166,15 @@ def parse_args() -> argparse.Namespace:
         "--model-name",
         type=str,
         default="sentence-transformers/all-mpnet-base-v2",
-        help="SentenceTransformer model to use for embeddings.",
+        help=(
+            "SentenceTransformer model name, or a local ONNX export directory "
+            "to embed via ONNX Runtime."
+        ),
     )
     parser.add_argument(
         "--batch-size",
         type=int,
-        default=64,
+        default=256,
         help="Number of chunks to process per batch.",
     )
     parser.add_argument(
@@ -125,6 +182,13 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Delete the collection before rebuilding.",
     )
+    parser.add_argument(
+        "--hnsw-space",
+        type=str,
+        choices=["ip", "cosine"],
+        default="ip",
+        help="HNSW distance space; ip matches cosine on normalized vectors.",
+    )
     return parser.parse_args()
 
 
@@ -137,6 +201,7 @@ def main() -> None:
         model_name=args.model_name,
         batch_size=args.batch_size,
         reset=args.reset,
+        hnsw_space=args.hnsw_space,
     )
 
 
@@ -4,16 +4,31 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
+import multiprocessing
+import os
 import re
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable, List, Optional, Tuple
 
+import numpy as np
 from bs4 import BeautifulSoup
 
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:  # selectolax is optional; fall back to BeautifulSoup
+    HTMLParser = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 CHUNK_SIZE = 2000
+WRITE_BUFFER_BYTES = 1 << 20
 CHUNK_OVERLAP = 200
 
 
@@ -27,11 +42,34 @@ class SourceDoc:
     namespace: Optional[str] = None
 
 
+# Combined CR/LF runs must be matched before the lone-\r branch: otherwise
+# a run like "\r\n\r\n" becomes four newlines that nothing collapses,
+# breaking the no-\n{3,} postcondition downstream chunking relies on.
+_CLEAN_RE = re.compile(r"[\r\n]{3,}|\r|[ \t]+")
+
+
+def _clean_repl(match: re.Match) -> str:
+    text = match.group(0)
+    if text[0] in "\r\n":
+        return "\n\n" if len(text) >= 3 else "\n"
+    return " "
+
+
 def clean_text(value: str) -> str:
-    value = re.sub(r"\r", "\n", value)
-    value = re.sub(r"[ \t]+", " ", value)
-    value = re.sub(r"\n{3,}", "\n\n", value)
-    return value.strip()
+    return _CLEAN_RE.sub(_clean_repl, value).strip()
+
+
+def _newline_positions(text: str) -> np.ndarray:
+    """Return all newline offsets, vectorized over bytes for ASCII text."""
+    if text.isascii():
+        data = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+        return np.nonzero(data == 0x0A)[0]
+    positions: List[int] = []
+    idx = text.find("\n")
+    while idx != -1:
+        positions.append(idx)
+        idx = text.find("\n", idx + 1)
+    return np.asarray(positions, dtype=np.int64)
 
 
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Iterable[str]:
@@ -40,13 +78,16 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVE
     clean = text
     start = 0
     length = len(clean)
+    nl_idx = _newline_positions(clean)
     chunks: List[str] = []
     while start < length:
         end = min(start + chunk_size, length)
-        if end < length:
-            newline = clean.rfind("\n", start, end)
-            if newline > start + 200:
-                end = newline
+        if end < length and nl_idx.size:
+            pos = int(np.searchsorted(nl_idx, end)) - 1
+            if pos >= 0:
+                newline = int(nl_idx[pos])
+                if newline > start + 200:
+                    end = newline
         chunk = clean[start:end].strip()
         if chunk:
             chunks.append(chunk)
@@ -56,7 +97,7 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVE
     return chunks
 
 
-def detect_metadata(path: Path, soup: BeautifulSoup, title: str) -> Tuple[str, Optional[str], Optional[str]]:
+def detect_metadata(path: Path, title: str, heading: Optional[str]) -> Tuple[str, Optional[str], Optional[str]]:
     filename = path.name
     lower = title.lower()
     kind = "page"
@@ -91,10 +132,8 @@ def detect_metadata(path: Path, soup: BeautifulSoup, title: str) -> Tuple[str, O
         kind = "module"
         symbol = title.replace("Module Reference", "").strip()
 
-    if not symbol:
-        header = soup.find("div", class_="title")
-        if header:
-            symbol = header.get_text(" ", strip=True)
+    if not symbol and heading:
+        symbol = heading
 
     namespace = None
     if symbol and "::" in symbol:
@@ -103,24 +142,51 @@ def detect_metadata(path: Path, soup: BeautifulSoup, title: str) -> Tuple[str, O
     return kind, symbol, namespace
 
 
-def extract_body_text(soup: BeautifulSoup) -> str:
+def _parse_html_bs4(html: str) -> Tuple[Optional[str], Optional[str], str]:
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else None
+    header = soup.find("div", class_="title")
+    heading = header.get_text(" ", strip=True) if header else None
     for tag in soup(["script", "style", "noscript", "header", "footer"]):
         tag.decompose()
     main = soup.select_one("div.contents") or soup.select_one("div#doc-content") or soup.body
     if main is None:
-        return ""
+        return title, heading, ""
     for nav in main.select("div.navpath, div.header, div.headertitle"):
         nav.decompose()
     text = main.get_text("\n", strip=True)
-    return clean_text(text)
+    return title, heading, clean_text(text)
+
+
+def _parse_html_selectolax(html: str) -> Tuple[Optional[str], Optional[str], str]:
+    tree = HTMLParser(html)
+    title_node = tree.css_first("title")
+    title = title_node.text(strip=True) if title_node else None
+    heading_node = tree.css_first("div.title")
+    heading = heading_node.text(strip=True) if heading_node else None
+    for node in tree.css("script, style, noscript, header, footer"):
+        node.decompose()
+    main = (
+        tree.css_first("div.contents")
+        or tree.css_first("div#doc-content")
+        or tree.body
+    )
+    if main is None:
+        return title, heading, ""
+    for nav in main.css("div.navpath, div.header, div.headertitle"):
+        nav.decompose()
+    text = main.text(separator="\n", strip=True)
+    return title, heading, clean_text(text)
 
 
 def parse_html_file(path: Path) -> SourceDoc:
     html = path.read_text(encoding="utf-8", errors="ignore")
-    soup = BeautifulSoup(html, "html.parser")
-    title = soup.title.get_text(strip=True) if soup.title else path.stem
-    kind, symbol, namespace = detect_metadata(path, soup, title)
-    body = extract_body_text(soup)
+    if HTMLParser is not None:
+        title, heading, body = _parse_html_selectolax(html)
+    else:
+        title, heading, body = _parse_html_bs4(html)
+    title = title or path.stem
+    kind, symbol, namespace = detect_metadata(path, title, heading)
     header_lines = [f"Title: {title}", f"Kind: {kind}"]
     if symbol:
         header_lines.append(f"Symbol: {symbol}")
@@ -149,25 +215,60 @@ def parse_markdown_file(path: Path) -> SourceDoc:
     return SourceDoc(path=path, text=text, title=title, kind="markdown", symbol=title, namespace=None)
 
 
-def discover_documents(html_dir: Path, markdown_dir: Path) -> Iterable[SourceDoc]:
-    if html_dir.exists():
-        for path in sorted(html_dir.rglob("*.htm*")):
+def discover_documents(
+    html_dir: Path, markdown_dir: Path, jobs: int = 1
+) -> Iterable[SourceDoc]:
+    """Parse all documentation files, optionally across a process pool.
+
+    Each file is parsed independently and the work is CPU-bound, so with
+    ``jobs > 1`` the HTML and markdown files are fanned out to worker
+    processes and results are streamed back as they finish.
+    """
+    html_paths = sorted(html_dir.rglob("*.htm*")) if html_dir.exists() else []
+    md_paths = sorted(markdown_dir.rglob("*.md")) if markdown_dir.exists() else []
+    if jobs <= 1:
+        for path in html_paths:
             yield parse_html_file(path)
-    if markdown_dir.exists():
-        for path in sorted(markdown_dir.rglob("*.md")):
+        for path in md_paths:
             yield parse_markdown_file(path)
+        return
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap_unordered(parse_html_file, html_paths, chunksize=32)
+        yield from pool.imap_unordered(parse_markdown_file, md_paths, chunksize=32)
 
 
-def write_chunks(docs: Iterable[SourceDoc], output_path: Path) -> Tuple[int, int]:
+def _dump_record(record: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(record)
+    return json.dumps(record, ensure_ascii=False).encode("utf-8")
+
+
+def write_chunks(docs: Iterable[SourceDoc], output_path: Path) -> Tuple[int, int, int]:
     output_path.parent.mkdir(parents=True, exist_ok=True)
     doc_count = 0
     chunk_count = 0
-    with output_path.open("w", encoding="utf-8") as fh:
+    duplicate_count = 0
+    # Doxygen repeats navbars, member tables, and inherited listings across
+    # pages; deduplicating identical chunk texts up front saves the embedder
+    # (the indexing bottleneck) from re-encoding them downstream.
+    seen: set = set()
+    buffer = bytearray()
+    with output_path.open("wb") as fh:
         for doc in docs:
             chunks = chunk_text(doc.text)
             if not chunks:
                 continue
-            for idx, chunk in enumerate(chunks):
+            emitted = 0
+            for chunk in chunks:
+                digest = hashlib.blake2b(
+                    chunk.encode("utf-8"), digest_size=16
+                ).digest()
+                if digest in seen:
+                    duplicate_count += 1
+                    continue
+                seen.add(digest)
+                idx = emitted
+                emitted += 1
                 record = {
                     "source": str(doc.path),
                     "kind": doc.kind,
@@ -177,10 +278,16 @@ def write_chunks(docs: Iterable[SourceDoc], output_path: Path) -> Tuple[int, int
                     "chunk_index": idx,
                     "text": chunk,
                 }
-                fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+                buffer += _dump_record(record)
+                buffer += b"\n"
                 chunk_count += 1
+                if len(buffer) > WRITE_BUFFER_BYTES:
+                    fh.write(buffer)
+                    buffer.clear()
             doc_count += 1
-    return doc_count, chunk_count
+        if buffer:
+            fh.write(buffer)
+    return doc_count, chunk_count, duplicate_count
 
 
 def parse_args() -> argparse.Namespace:
@@ -205,15 +312,22 @@ def parse_args() -> argparse.Namespace:
         default=Path("rag_data/ompl_doc_chunks.jsonl"),
         help="Output JSONL file for text chunks.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes for parsing documents.",
+    )
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
-    docs = list(discover_documents(args.html_dir, args.markdown_dir))
-    doc_count, chunk_count = write_chunks(docs, args.output)
+    docs = discover_documents(args.html_dir, args.markdown_dir, jobs=args.jobs)
+    doc_count, chunk_count, duplicate_count = write_chunks(docs, args.output)
     print(
         f"Wrote {chunk_count} chunks from {doc_count} documents to {args.output.resolve()}"
+        f" ({duplicate_count} duplicate chunks skipped)"
     )
 
 
@@ -5,19 +5,41 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
 import re
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, List, Optional, Sequence
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
 import fitz  # PyMuPDF
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = None
+    njit = None
+
 
 CHUNK_SIZE = 1800
 CHUNK_OVERLAP = 200
+WRITE_BUFFER_BYTES = 1 << 20
 REFERENCE_HEADING_PATTERN = re.compile(
     r"(?im)^\s*(references|literature\s+cited|bibliography)\s*$"
 )
+_CR_RE = re.compile(r"\r")
+_WS_RE = re.compile(r"[ \t]+")
+_BLANK_RE = re.compile(r"\n{3,}")
+_REF_ENTRY_RE = re.compile(r"(?m)^[^\S\n]*(?:\[\d+\]|\d+\.)")
+_BLANKLINE_RE = re.compile(r"\n\s*\n")
 
 
 @dataclass
@@ -30,24 +52,82 @@ class SectionText:
 
 
 def clean_text(value: str) -> str:
-    value = re.sub(r"\r", "\n", value)
-    value = re.sub(r"[ \t]+", " ", value)
-    value = re.sub(r"\n{3,}", "\n\n", value)
+    value = _CR_RE.sub("\n", value)
+    value = _WS_RE.sub(" ", value)
+    value = _BLANK_RE.sub("\n\n", value)
     return value.strip()
 
 
+def _compute_cuts(n, chunk_size, overlap, newlines):
+    """Index-only half of chunk_text: return [start0, end0, start1, end1, ...].
+
+    Pure arithmetic over the newline-offset array, so it compiles in numba's
+    nopython mode; string materialization stays in chunk_text.
+    """
+    cap = 32
+    cuts = np.empty(cap, np.int64)
+    count = 0
+    start = 0
+    while start < n:
+        end = start + chunk_size
+        if end > n:
+            end = n
+        if end < n and newlines.size:
+            pos = np.searchsorted(newlines, end - 1, side="right") - 1
+            if pos >= 0:
+                newline = newlines[pos]
+                if newline > start + 200:
+                    end = newline
+        if count + 2 > cap:
+            cap *= 2
+            grown = np.empty(cap, np.int64)
+            grown[:count] = cuts[:count]
+            cuts = grown
+        cuts[count] = start
+        cuts[count + 1] = end
+        count += 2
+        if end >= n:
+            break
+        start = end - overlap
+        if start < 0:
+            start = 0
+    return cuts[:count]
+
+
+if njit is not None:
+    _compute_cuts = njit(cache=True)(_compute_cuts)
+
+
 def chunk_text(text: str, chunk_size: int, overlap: int) -> Iterable[str]:
     if not text:
         return []
+    # One pass to collect newline offsets; each chunk boundary then becomes a
+    # bisect instead of an O(chunk_size) rfind scan.
+    newlines = array("i")
+    idx = text.find("\n")
+    while idx != -1:
+        newlines.append(idx)
+        idx = text.find("\n", idx + 1)
+    chunks: List[str] = []
+    if njit is not None:
+        cuts = _compute_cuts(
+            len(text), chunk_size, overlap, np.asarray(newlines, dtype=np.int64)
+        )
+        for pos in range(0, cuts.size, 2):
+            chunk = text[cuts[pos] : cuts[pos + 1]].strip()
+            if chunk:
+                chunks.append(chunk)
+        return chunks
     start = 0
     text_len = len(text)
-    chunks: List[str] = []
     while start < text_len:
         end = min(start + chunk_size, text_len)
-        if end < text_len:
-            newline = text.rfind("\n", start, end)
-            if newline > start + 200:
-                end = newline
+        if end < text_len and newlines:
+            pos = bisect_right(newlines, end - 1) - 1
+            if pos >= 0:
+                newline = newlines[pos]
+                if newline > start + 200:
+                    end = newline
         chunk = text[start:end].strip()
         if chunk:
             chunks.append(chunk)
@@ -67,36 +147,30 @@ def is_reference_section(title: str) -> bool:
 
 
 def split_reference_entries(text: str) -> List[str]:
-    pattern = re.compile(r"^\s*(\[\d+\]|\d+\.)")
-    lines = text.splitlines()
-    entries: List[List[str]] = []
-    current: List[str] = []
-
-    def flush(buffer: List[str]) -> None:
-        cleaned = [line for line in buffer if line.strip()]
-        if cleaned:
-            entries.append(cleaned)
-
-    for line in lines:
-        if pattern.match(line):
-            if current:
-                flush(current)
-            current = [line]
-        else:
-            current.append(line)
-    if current:
-        flush(current)
-
-    flat_entries = ["\n".join(entry).strip() for entry in entries if entry]
-    if flat_entries:
-        return flat_entries
-    blocks = [block.strip() for block in re.split(r"\n\s*\n", text) if block.strip()]
+    # Locate entry markers in one multiline scan and slice between them,
+    # instead of running the marker regex against every individual line.
+    starts = [match.start() for match in _REF_ENTRY_RE.finditer(text)]
+    if starts:
+        bounds = starts if starts[0] == 0 else [0, *starts]
+        bounds.append(len(text))
+        entries: List[str] = []
+        for begin, end in zip(bounds, bounds[1:]):
+            entry = "\n".join(
+                line for line in text[begin:end].splitlines() if line.strip()
+            ).strip()
+            if entry:
+                entries.append(entry)
+        if entries:
+            return entries
+    blocks = [block.strip() for block in _BLANKLINE_RE.split(text) if block.strip()]
     return blocks or [text.strip()]
 
 
 def chunk_reference_section(
     header_text: str, entries: List[str], chunk_size: int
 ) -> List[str]:
+    # header_text and the entries are already clean; chunks below are plain
+    # concatenations so the three-regex pipeline is not re-run per chunk.
     prefix = clean_text(header_text)
     if not entries:
         return [prefix]
@@ -113,29 +187,52 @@ def chunk_reference_section(
             continue
         addition_len = len(entry) + (2 if current else 0)
         if current and current_len + addition_len > limit:
-            chunk_body = "\n\n".join(current)
-            chunks.append(clean_text(base + chunk_body))
+            chunks.append(base + "\n\n".join(current))
             current = [entry]
             current_len = len(entry)
         else:
-            if not current:
-                current_len = len(entry)
-            else:
-                current_len += addition_len
             current.append(entry)
+            current_len += addition_len
     if current:
-        chunk_body = "\n\n".join(current)
-        chunks.append(clean_text(base + chunk_body))
+        chunks.append(base + "\n\n".join(current))
     return chunks
 
 
-def extract_page_texts(doc: fitz.Document) -> List[str]:
-    pages: List[str] = []
+PAGE_SEPARATOR = "\n\n"
+
+
+def extract_page_texts(doc: fitz.Document) -> Tuple[str, List[int]]:
+    """Extract the document as one concatenated string plus page offsets.
+
+    Returns ``(full_text, page_offsets)`` where ``page_offsets[i]`` is the
+    character offset of page ``i`` and a final sentinel equals
+    ``len(full_text)``, so any page range becomes an O(1) slice instead of a
+    fresh join per section.
+    """
+    parts: List[str] = []
+    offsets: List[int] = []
+    position = 0
     for idx in range(doc.page_count):
         page = doc.load_page(idx)
-        text = page.get_text("text")
-        pages.append(clean_text(text))
-    return pages
+        # Build the TextPage directly and use the plain-text extractor; this
+        # is MuPDF's lightest extraction mode and skips the per-call TextPage
+        # setup that page.get_text("text") repeats internally. TEXTFLAGS_TEXT
+        # is the exact flag set get_text("text") uses (ligatures, whitespace,
+        # mediabox clip), so the extracted characters are unchanged.
+        textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+        text = clean_text(textpage.extractText())
+        # Separate only non-empty pages: a blank page between two separators
+        # would leave a \n{3,} run in section slices that the old per-section
+        # re-clean used to collapse.
+        if text and position:
+            parts.append(PAGE_SEPARATOR)
+            position += len(PAGE_SEPARATOR)
+        offsets.append(position)
+        if text:
+            parts.append(text)
+            position += len(text)
+    offsets.append(position)
+    return "".join(parts), offsets
 
 
 def section_ranges_from_toc(
@@ -145,18 +242,22 @@ def section_ranges_from_toc(
     sections: List[SectionText] = []
     if not toc:
         return sections
-    for idx, entry in enumerate(toc):
-        if len(entry) < 3:
-            continue
-        level = int(entry[0])
-        title = str(entry[1]).strip() or "Untitled"
-        start_page = max(int(entry[2]), 1)
+    # Normalize the entries once; the old inner loop re-validated and
+    # re-sliced the remaining TOC for every entry, which is quadratic.
+    cleaned = [
+        (int(entry[0]), str(entry[1]).strip() or "Untitled", max(int(entry[2]), 1))
+        for entry in toc
+        if len(entry) >= 3
+    ]
+    count = len(cleaned)
+    for idx, (level, title, start_page) in enumerate(cleaned):
         start_idx = min(start_page - 1, total_pages)
+        # Outlines are not guaranteed page-ordered (appendices,
+        # back-references), so each entry rescans forward from its successor;
+        # iterating over an index range keeps the per-entry slice away.
         end_idx = total_pages
-        for next_entry in toc[idx + 1 :]:
-            if len(next_entry) < 3:
-                continue
-            next_page = max(int(next_entry[2]), 1) - 1
+        for nxt in range(idx + 1, count):
+            next_page = cleaned[nxt][2] - 1
             if next_page > start_idx:
                 end_idx = next_page
                 break
@@ -174,43 +275,60 @@ def section_ranges_from_toc(
     return sections
 
 
-def fill_section_texts(sections: List[SectionText], pages: List[str]) -> List[SectionText]:
+def fill_section_texts(
+    sections: List[SectionText], full_text: str, page_offsets: List[int]
+) -> List[SectionText]:
     if not sections:
         return sections
-    total_pages = len(pages)
-    for idx, section in enumerate(sections):
+    total_pages = len(page_offsets) - 1
+    for section in sections:
         start_idx = min(section.page_start - 1, total_pages)
         end_idx = min(section.page_end, total_pages)
-        section.text = clean_text("\n\n".join(pages[start_idx:end_idx]))
+        section.text = full_text[page_offsets[start_idx] : page_offsets[end_idx]].strip()
     return [sec for sec in sections if sec.text]
 
 
-def fallback_sections(pages: List[str], paper_title: str) -> List[SectionText]:
+def fallback_sections(
+    full_text: str, total_pages: int, paper_title: str
+) -> List[SectionText]:
     return [
         SectionText(
             title=paper_title,
             level=1,
             page_start=1,
-            page_end=len(pages),
-            text=clean_text("\n\n".join(pages)),
+            page_end=total_pages,
+            text=full_text.strip(),
         )
     ]
 
 
+def _dump_record(record: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(record)
+    return json.dumps(record, ensure_ascii=False).encode("utf-8")
+
+
+# One alternation replaces the lower() copy plus five substring scans; the
+# bare "tam" branch deliberately has no word boundaries so acronyms like
+# "TAMP" keep matching, and the co-occurrence branches accept either order.
+_TAMP_RE = re.compile(
+    r"task[ -]and|tam|task.*?motion|motion.*?task",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
 def infer_topic(paper_title: str) -> str:
-    lower = paper_title.lower()
-    if "task and" in lower or "task-and" in lower or "tam" in lower:
-        return "task_and_motion_planning"
-    if "task" in lower and "motion" in lower:
+    if _TAMP_RE.search(paper_title):
         return "task_and_motion_planning"
     return "motion_planning"
 
 
 def extract_reference_tail(text: str) -> Optional[tuple[str, str, str]]:
-    matches = list(REFERENCE_HEADING_PATTERN.finditer(text))
-    if not matches:
+    match = None
+    for candidate in REFERENCE_HEADING_PATTERN.finditer(text):
+        match = candidate
+    if match is None:
         return None
-    match = matches[-1]
     tail = text[match.end() :].strip()
     if not tail:
         return None
@@ -260,14 +378,25 @@ def process_pdf(
     chunk_size: int,
     overlap: int,
 ) -> List[dict]:
-    doc = fitz.open(pdf_path)
+    # The filetype hint skips MuPDF's format sniffing on open.
+    doc = fitz.open(str(pdf_path), filetype="pdf")
     paper_title = doc.metadata.get("title") or pdf_path.stem
-    page_texts = extract_page_texts(doc)
-    toc = doc.get_toc(simple=False) or doc.get_toc()
-    sections = section_ranges_from_toc(toc, len(page_texts))
-    sections = fill_section_texts(sections, page_texts)
+    full_text, page_offsets = extract_page_texts(doc)
+    total_pages = len(page_offsets) - 1
+    # get_toc walks the PDF outline tree on every call; fetch the detailed
+    # form once and only fall back to the simple form when it was empty.
+    # Broken outline trees in damaged PDFs can make the walk raise; treat
+    # that like a missing outline and let fallback_sections take over.
+    try:
+        toc = doc.get_toc(simple=False)
+        if not toc:
+            toc = doc.get_toc(simple=True)
+    except RuntimeError:
+        toc = []
+    sections = section_ranges_from_toc(toc, total_pages)
+    sections = fill_section_texts(sections, full_text, page_offsets)
     if not sections:
-        sections = fallback_sections(page_texts, paper_title)
+        sections = fallback_sections(full_text, total_pages, paper_title)
     sections = expand_reference_sections(sections)
 
     topic = infer_topic(paper_title)
@@ -279,13 +408,16 @@ def process_pdf(
             f"Level: {section.level}",
             f"Pages: {section.page_start}-{section.page_end}",
         ]
-        header_text = "\n".join(header_lines)
-        body_text = clean_text(section.text)
+        # PDF metadata and TOC titles can carry \r, tabs, or space runs, so
+        # the header needs one clean_text pass of its own; section bodies
+        # were already cleaned when the pages were extracted.
+        header_text = clean_text("\n".join(header_lines))
+        body_text = section.text
         if is_reference_section(section.title):
             entries = split_reference_entries(body_text)
             section_chunks = chunk_reference_section(header_text, entries, chunk_size)
         else:
-            section_text = clean_text(header_text + "\n\n" + body_text)
+            section_text = header_text + "\n\n" + body_text
             section_chunks = chunk_text(section_text, chunk_size, overlap)
         for idx, chunk in enumerate(section_chunks):
             records.append(
@@ -334,6 +466,12 @@ def parse_args() -> argparse.Namespace:
         default=CHUNK_OVERLAP,
         help="Overlap size between chunks.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes for parsing PDFs.",
+    )
     return parser.parse_args()
 
 
@@ -345,18 +483,60 @@ def main() -> None:
     output_path = args.output
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
+    pdf_paths = sorted(pdf_dir.glob("*.pdf"))
+    jobs = min(args.jobs, len(pdf_paths)) or 1
     total_docs = 0
     total_chunks = 0
-    with output_path.open("w", encoding="utf-8") as handle:
-        for pdf_path in sorted(pdf_dir.glob("*.pdf")):
-            records = process_pdf(
-                pdf_path, chunk_size=args.chunk_size, overlap=args.chunk_overlap
-            )
+    with output_path.open("wb") as handle:
+        # Accumulate serialized records and hand the OS one large write per
+        # ~1 MB instead of crossing the write boundary once per record.
+        buffer = bytearray()
+
+        def emit(pdf_path: Path, records: List[dict]) -> None:
+            nonlocal total_docs, total_chunks
             for record in records:
-                handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+                buffer += _dump_record(record)
+                buffer += b"\n"
+            if len(buffer) >= WRITE_BUFFER_BYTES:
+                handle.write(buffer)
+                buffer.clear()
             print(f"Processed {pdf_path.name}: {len(records)} chunks")
             total_docs += 1
             total_chunks += len(records)
+
+        if jobs <= 1:
+            for pdf_path in pdf_paths:
+                emit(
+                    pdf_path,
+                    process_pdf(
+                        pdf_path,
+                        chunk_size=args.chunk_size,
+                        overlap=args.chunk_overlap,
+                    ),
+                )
+        else:
+            # Each PDF is parsed in its own worker (MuPDF contexts are not
+            # shared across processes); the main process keeps serialization
+            # and preserves the sorted output order via a small reorder buffer.
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = {
+                    executor.submit(
+                        process_pdf,
+                        pdf_path,
+                        chunk_size=args.chunk_size,
+                        overlap=args.chunk_overlap,
+                    ): index
+                    for index, pdf_path in enumerate(pdf_paths)
+                }
+                done: Dict[int, List[dict]] = {}
+                next_index = 0
+                for future in as_completed(futures):
+                    done[futures[future]] = future.result()
+                    while next_index in done:
+                        emit(pdf_paths[next_index], done.pop(next_index))
+                        next_index += 1
+        if buffer:
+            handle.write(buffer)
     print(
         f"Wrote {total_chunks} chunks from {total_docs} papers to {output_path.resolve()}"
     )
@@ -5,7 +5,12 @@ from __future__ import annotations
 
 import argparse
 
-from rag.query_pipeline import QueryResult, classify_question, run_rag_query
+from rag.query_pipeline import (
+    QueryResult,
+    call_ollama,
+    classify_question,
+    run_rag_query,
+)
 
 OMPL_ROUTING_INSTRUCTIONS = (
     "You are answering implementation-focused questions about motion planning systems. "
@@ -108,6 +113,10 @@ def main() -> None:
         ollama_model=classifier_model,
         ollama_url=args.ollama_url,
         temperature=args.classifier_temperature,
+        # Share the OMPL index's embedder and cache location so
+        # classification never loads a second embedding model.
+        model_name=args.ompl_model,
+        persist_dir=args.ompl_persist_dir,
     )
     label = classification.get("label", "general")
     reason = classification.get("reason", "")
@@ -131,7 +140,17 @@ def main() -> None:
     print(f"Routed target: {target}")
 
     if target == "skip":
+        # General questions gain nothing from corpus retrieval; answer
+        # directly instead of paying embedding + ANN search + context assembly.
         print("General question detected. Skipping retrieval.")
+        answer = call_ollama(
+            url=args.ollama_url,
+            model=args.ollama_model,
+            prompt=args.question,
+            temperature=args.temperature,
+        )
+        print("\n# Direct Answer (no retrieval)")
+        print(answer)
         return
 
     if target == "ompl":
@@ -154,7 +173,7 @@ def main() -> None:
         topic = survey_topic_override or args.survey_topic
         metadata_filter = None
         if topic != "all":
-            metadata_filter = {"topic": {"$eq": topic}}
+            metadata_filter = {"topic": topic}
         result = run_rag_query(
             args.question,
             persist_dir=args.survey_persist_dir,
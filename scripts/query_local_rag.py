@@ -5,7 +5,7 @@ from __future__ import annotations
 
 import argparse
 
-from rag.query_pipeline import QueryResult, run_rag_query
+from rag.query_pipeline import QueryResult, run_rag_queries, run_rag_query
 
 
 def run_query(
@@ -34,6 +34,31 @@ def run_query(
     return result.context, result.answer
 
 
+def run_queries(
+    questions: list[str],
+    *,
+    persist_dir: str = ".chroma",
+    collection_name: str = "ompl_docs_en",
+    model_name: str = "sentence-transformers/all-mpnet-base-v2",
+    ollama_model: str = "deepseek-r1:8b",
+    ollama_url: str = "http://localhost:11434",
+    top_k: int = 5,
+    temperature: float = 0.1,
+) -> list[tuple[str, str]]:
+    """Answer several questions at once via a single batched retrieval."""
+    results = run_rag_queries(
+        questions,
+        persist_dir=persist_dir,
+        collection_name=collection_name,
+        model_name=model_name,
+        ollama_model=ollama_model,
+        ollama_url=ollama_url,
+        top_k=top_k,
+        temperature=temperature,
+    )
+    return [(result.context, result.answer) for result in results]
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Query OMPL docs with a local LLM.")
     parser.add_argument("question", type=str, help="質問文（日本語/英語どちらでも可）")
@@ -63,7 +63,7 @@ def main() -> None:
 
     metadata_filter = None
     if args.topic != "all":
-        metadata_filter = {"topic": {"$eq": args.topic}}
+        metadata_filter = {"topic": args.topic}
 
     result: QueryResult = run_rag_query(
         args.question,